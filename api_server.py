@@ -1,21 +1,35 @@
 from __future__ import annotations
 
 import asyncio
-import http.server
-import socketserver
-import threading
+import hashlib
+import logging
+import mimetypes
+import os
+import time
+from collections import OrderedDict
+from collections.abc import AsyncIterator
 from contextlib import asynccontextmanager
 from pathlib import Path
 from typing import Any
+from urllib.parse import unquote, urlsplit
 
-from fastapi import FastAPI, HTTPException
-from fastapi.responses import Response
+import orjson
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.responses import StreamingResponse
+from fastapi.routing import APIRoute
 from pydantic import BaseModel
 
+logger = logging.getLogger(__name__)
+
 PDF_MARGIN = "0.4in"
 STATIC_DIR = Path("./static").resolve()
-STATIC_PORT = 8001
+STATIC_ORIGIN = "http://cv.static"
+CV_PAGE = os.environ.get("CV_PAGE", "cv_yaml.html")
 MAX_CONCURRENT_PDFS = 5
+POOL_ACQUIRE_TIMEOUT = 30.0
+RESULT_CACHE_SIZE = 32
+RESULT_CACHE_TTL = 60.0
+RESPONSE_CHUNK_SIZE = 64 * 1024
 
 
 class GenerateRequest(BaseModel):
@@ -23,87 +37,236 @@ class GenerateRequest(BaseModel):
     data: dict[str, Any]
 
 
-def create_directory_handler(directory: Path) -> type[http.server.SimpleHTTPRequestHandler]:
-    class Handler(http.server.SimpleHTTPRequestHandler):
-        def __init__(self, *args: Any, **kwargs: Any) -> None:
-            super().__init__(*args, directory=str(directory), **kwargs)
+class ORJSONRequest(Request):
+    async def json(self) -> Any:
+        if not hasattr(self, "_json"):
+            self._json = orjson.loads(await self.body())
+        return self._json
 
-        def log_message(self, _fmt: str, *_args: Any) -> None:
-            return
 
-    return Handler
+class ORJSONRoute(APIRoute):
+    def get_route_handler(self):
+        handler = super().get_route_handler()
+
+        async def route_handler(request: Request):
+            return await handler(ORJSONRequest(request.scope, request.receive))
+
+        return route_handler
+
+
+async def iter_chunks(content: bytes, chunk_size: int = RESPONSE_CHUNK_SIZE) -> AsyncIterator[memoryview]:
+    view = memoryview(content)
+    for offset in range(0, len(view), chunk_size):
+        yield view[offset:offset + chunk_size]
+
+
+def check_page_is_fresh() -> None:
+    page_file = STATIC_DIR / CV_PAGE
+    if not page_file.is_file():
+        raise RuntimeError(f"{CV_PAGE} not found in {STATIC_DIR}")
+    if CV_PAGE == "cv_yaml.html":
+        return
+
+    rebuild = "Re-run: python -m tools.inline_assets"
+    manifest = page_file.with_name(page_file.name + ".sources")
+    try:
+        sources = orjson.loads(manifest.read_bytes())
+        newest = max((STATIC_DIR / source).stat().st_mtime_ns for source in sources)
+    except (OSError, ValueError) as e:
+        raise RuntimeError(f"Cannot verify the sources of {CV_PAGE} ({e}). {rebuild}") from e
+    if page_file.stat().st_mtime_ns < newest:
+        raise RuntimeError(f"{CV_PAGE} is older than the files it was built from. {rebuild}")
 
 
 class PDFService:
     def __init__(self) -> None:
         self.browser = None
         self.playwright = None
-        self.httpd: socketserver.TCPServer | None = None
-        self.semaphore = asyncio.Semaphore(MAX_CONCURRENT_PDFS)
+        self._static_cache: dict[str, tuple[int, bytes, str]] = {}
+        self._pool: asyncio.Queue = asyncio.Queue(maxsize=MAX_CONCURRENT_PDFS)
+        self._replacements: set[asyncio.Task[None]] = set()
+        self._inflight: dict[str, asyncio.Future[bytes]] = {}
+        self._results: OrderedDict[str, tuple[float, bytes]] = OrderedDict()
 
     async def start(self) -> None:
-        handler = create_directory_handler(STATIC_DIR)
-        self.httpd = socketserver.TCPServer(("", STATIC_PORT), handler)  # type: ignore[arg-type]
-        thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
-        thread.start()
+        check_page_is_fresh()
 
         from playwright.async_api import async_playwright
 
         self.playwright = await async_playwright().start()
         self.browser = await self.playwright.chromium.launch()
 
+        for _ in range(MAX_CONCURRENT_PDFS):
+            await self._pool.put(await self._open_page())
+
     async def stop(self) -> None:
+        for task in list(self._replacements):
+            task.cancel()
+        await asyncio.gather(*self._replacements, return_exceptions=True)
+        while not self._pool.empty():
+            slot = self._pool.get_nowait()
+            if slot is not None:
+                await self._close_context(slot[0])
         if self.browser:
             await self.browser.close()
         if self.playwright:
             await self.playwright.stop()
-        if self.httpd:
-            self.httpd.shutdown()
-            self.httpd.server_close()
+
+    @staticmethod
+    def _stat_static(path: str) -> tuple[Path, int] | None:
+        file = (STATIC_DIR / path.lstrip("/")).resolve()
+        if not file.is_relative_to(STATIC_DIR):
+            return None
+        try:
+            stat = file.stat()
+        except OSError:
+            return None
+        if not file.is_file():
+            return None
+        return file, stat.st_mtime_ns
+
+    async def _read_static(self, path: str) -> tuple[bytes, str] | None:
+        found = await asyncio.to_thread(self._stat_static, path)
+        if found is None:
+            return None
+        file, mtime = found
+
+        key = str(file)
+        cached = self._static_cache.get(key)
+        if cached is None or cached[0] != mtime:
+            try:
+                body = await asyncio.to_thread(file.read_bytes)
+            except OSError:
+                return None
+            content_type = mimetypes.guess_type(file.name)[0] or "application/octet-stream"
+            cached = self._static_cache[key] = (mtime, body, content_type)
+        return cached[1], cached[2]
+
+    async def _serve_static(self, route: Any) -> None:
+        asset = await self._read_static(unquote(urlsplit(route.request.url).path))
+        if asset is None:
+            await route.fulfill(status=404)
+            return
+        body, content_type = asset
+        await route.fulfill(body=body, content_type=content_type)
+
+    async def _open_page(self) -> tuple[Any, Any]:
+        warmed_up = False
+
+        async def route_request(route: Any) -> None:
+            if route.request.url.startswith(f"{STATIC_ORIGIN}/"):
+                await self._serve_static(route)
+            elif warmed_up:
+                await route.abort()
+            else:
+                await route.continue_()
+
+        context = await self.browser.new_context()
+        try:
+            await context.add_init_script(path=STATIC_DIR / "render_bootstrap.js")
+            await context.route("**/*", route_request)
+            page = await context.new_page()
+            await page.goto(
+                f"{STATIC_ORIGIN}/{CV_PAGE}",
+                wait_until="networkidle",
+            )
+            await page.wait_for_selector("#cv-container")
+        except BaseException:
+            await self._close_context(context)
+            raise
+        warmed_up = True
+        return context, page
+
+    @staticmethod
+    async def _close_context(context: Any) -> None:
+        try:
+            await context.close()
+        except Exception:
+            logger.warning("Failed to close a PDF browser context", exc_info=True)
 
     async def generate_pdf(self, data: dict[str, Any], language: str) -> bytes:
+        if self.browser is None or not self.browser.is_connected():
+            raise HTTPException(status_code=503, detail="PDF renderer is not running")
+
         if language not in data:
             raise HTTPException(
                 status_code=400,
                 detail=f"Language '{language}' not found in data. Available: {list(data.keys())}",
             )
 
-        async with self.semaphore:
-            page = await self.browser.new_page()
-            try:
-                await page.goto(
-                    f"http://localhost:{STATIC_PORT}/cv_yaml.html",
-                    wait_until="networkidle",
-                )
-
-                await page.evaluate(
-                    """([data, lang]) => {
-                        cvData = data;
-                        currentLang = lang;
-                        renderCV();
-                    }""",
-                    [data, language],
-                )
-
-                await page.wait_for_selector("#cv")
-                await page.wait_for_function(
-                    "document.querySelector('#profile-picture')?.complete === true"
-                )
-
-                pdf_bytes = await page.pdf(
-                    format="A4",
-                    margin={
-                        "top": PDF_MARGIN,
-                        "right": PDF_MARGIN,
-                        "bottom": PDF_MARGIN,
-                        "left": PDF_MARGIN,
-                    },
-                    print_background=True,
-                    prefer_css_page_size=True,
-                )
-                return pdf_bytes
-            finally:
-                await page.close()
+        data_key = hashlib.blake2b(
+            orjson.dumps(data, option=orjson.OPT_SORT_KEYS), digest_size=16
+        ).hexdigest()
+        key = f"{language}:{data_key}"
+
+        cached = self._results.get(key)
+        if cached is not None and time.monotonic() - cached[0] < RESULT_CACHE_TTL:
+            self._results.move_to_end(key)
+            return cached[1]
+
+        render = self._inflight.get(key)
+        if render is None:
+            render = asyncio.ensure_future(self._render(data, language))
+            self._inflight[key] = render
+            render.add_done_callback(lambda task: self._store_result(key, task))
+        return await asyncio.shield(render)
+
+    def _store_result(self, key: str, task: asyncio.Future[bytes]) -> None:
+        del self._inflight[key]
+        if task.cancelled() or task.exception() is not None:
+            return
+        self._results[key] = (time.monotonic(), task.result())
+        self._results.move_to_end(key)
+        while len(self._results) > RESULT_CACHE_SIZE:
+            self._results.popitem(last=False)
+
+    async def _render(self, data: dict[str, Any], language: str) -> bytes:
+        try:
+            slot = await asyncio.wait_for(self._pool.get(), POOL_ACQUIRE_TIMEOUT)
+        except TimeoutError:
+            raise HTTPException(status_code=503, detail="All PDF renderers are busy") from None
+
+        context = None
+        try:
+            if slot is None:
+                slot = await self._open_page()
+            context, page = slot
+
+            await page.evaluate(
+                "([data, lang]) => window.__renderCV(data, lang)",
+                [data, language],
+            )
+
+            await page.wait_for_selector("#cv")
+            await page.wait_for_function(
+                "document.querySelector('#profile-picture')?.complete === true"
+            )
+
+            return await page.pdf(
+                format="A4",
+                margin={
+                    "top": PDF_MARGIN,
+                    "right": PDF_MARGIN,
+                    "bottom": PDF_MARGIN,
+                    "left": PDF_MARGIN,
+                },
+                print_background=True,
+                prefer_css_page_size=True,
+            )
+        finally:
+            task = asyncio.create_task(self._replace_page(context))
+            self._replacements.add(task)
+            task.add_done_callback(self._replacements.discard)
+
+    async def _replace_page(self, context: Any | None) -> None:
+        if context is not None:
+            await self._close_context(context)
+        try:
+            slot = await self._open_page()
+        except Exception:
+            logger.exception("Failed to warm a replacement PDF page")
+            slot = None
+        self._pool.put_nowait(slot)
 
 
 pdf_service = PDFService()
@@ -117,6 +280,7 @@ async def lifespan(app: FastAPI):
 
 
 app = FastAPI(title="CV PDF Generator API", lifespan=lifespan)
+app.router.route_class = ORJSONRoute
 
 
 @app.get("/health")
@@ -127,8 +291,17 @@ async def health():
 @app.post("/api/generate")
 async def generate_pdf(request: GenerateRequest):
     pdf_bytes = await pdf_service.generate_pdf(request.data, request.language)
-    return Response(
-        content=pdf_bytes,
+    return StreamingResponse(
+        iter_chunks(pdf_bytes),
         media_type="application/pdf",
-        headers={"Content-Disposition": "attachment; filename=cv.pdf"},
+        headers={
+            "Content-Disposition": "attachment; filename=cv.pdf",
+            "Content-Length": str(len(pdf_bytes)),
+        },
     )
+
+
+if __name__ == "__main__":
+    import uvicorn
+
+    uvicorn.run("api_server:app", host="0.0.0.0", port=8000, loop="uvloop", http="httptools")
@@ -4,13 +4,10 @@ from __future__ import annotations
 
 import argparse
 import asyncio
+import functools
 import http.server
-import socket
-import socketserver
-import subprocess
-import sys
+import pickle
 import threading
-import time
 from pathlib import Path
 from typing import TYPE_CHECKING
 
@@ -18,27 +15,27 @@ if TYPE_CHECKING:
     from typing import Any
 
 PDF_MARGIN = '0.4in'
+WEASYPRINT_REQUIREMENTS_ERROR = ("[ERROR] WeasyPrint dependencies are missing. Run: "
+                                 "pip install 'weasyprint>=59' jinja2 pyyaml")
 
 
-def is_port_available(port: int) -> bool:
-    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
+async def wait_for_server(port: int, timeout: float = 2.0) -> bool:
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + timeout
+    delay = 0.001
+    while loop.time() < deadline:
         try:
-            s.bind(("", port))
-            return True
-        except OSError:
-            return False
-
-
-def wait_for_server(port: int, timeout: float = 5.0) -> bool:
-    start = time.time()
-    while time.time() - start < timeout:
-        try:
-            with socket.create_connection(("localhost", port), timeout=0.5):
-                return True
+            _reader, writer = await asyncio.open_connection("localhost", port)
         except OSError:
-            time.sleep(0.1)
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, 0.05)
+        else:
+            writer.close()
+            await writer.wait_closed()
+            return True
     return False
 
+
 def create_directory_handler(directory: Path) -> type[http.server.SimpleHTTPRequestHandler]:
     class DirectoryHTTPRequestHandler(http.server.SimpleHTTPRequestHandler):
         def __init__(self, *args: Any, **kwargs: Any) -> None:
@@ -54,18 +51,19 @@ class CVPDFGenerator:
         self.cv_folder = Path(cv_folder).resolve()
         self.port = port
         self.version = version
-        self.httpd: socketserver.TCPServer | None = None
-
-    def start_server(self) -> None:
-        if not is_port_available(self.port):
-            raise RuntimeError(f"Port {self.port} is already in use. Try --port with a different number.")
+        self.httpd: http.server.ThreadingHTTPServer | None = None
+        self.browser = None
 
+    async def start_server(self) -> None:
         handler = create_directory_handler(self.cv_folder)
-        self.httpd = socketserver.TCPServer(("", self.port), handler)  # type: ignore[arg-type]
+        try:
+            self.httpd = http.server.ThreadingHTTPServer(("", self.port), handler)
+        except OSError as e:
+            raise RuntimeError(f"Port {self.port} is already in use. Try --port with a different number.") from e
         server_thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
         server_thread.start()
 
-        if not wait_for_server(self.port):
+        if not await wait_for_server(self.port):
             raise RuntimeError(f"Server failed to start on port {self.port}")
 
         print(f"[OK] Server started at http://localhost:{self.port}")
@@ -77,14 +75,12 @@ class CVPDFGenerator:
             print("[OK] Server stopped")
 
     async def generate_pdf_playwright(self, language: str = "en", output_file: str | None = None) -> None:
-        from playwright.async_api import async_playwright
-
         if not output_file:
             output_file = f"Lukasz Wisniewski CV {self.version.upper()} {language}.pdf"
 
-        async with async_playwright() as p:
-            browser = await p.chromium.launch()
-            page = await browser.new_page()
+        context = await self.browser.new_context()
+        try:
+            page = await context.new_page()
 
             url = f"http://localhost:{self.port}/cv_yaml.html?version={self.version}"
             await page.goto(url)
@@ -92,7 +88,10 @@ class CVPDFGenerator:
 
             if language == "pl":
                 await page.click("button:has-text('Polski')")
-                await page.wait_for_timeout(1000)
+                await page.wait_for_function(
+                    "document.documentElement.lang === 'pl'"
+                    " && document.querySelector('#profile-picture')?.complete === true"
+                )
 
             await page.pdf(
                 path=output_file,
@@ -106,30 +105,33 @@ class CVPDFGenerator:
                 print_background=True,
                 prefer_css_page_size=True
             )
+        finally:
+            await context.close()
 
-            await browser.close()
-            print(f"[OK] PDF generated: {output_file}")
+        print(f"[OK] PDF generated: {output_file}")
 
     async def generate_both_pdfs(self) -> None:
-        print(f"Generating English PDF ({self.version.upper()})...")
-        await self.generate_pdf_playwright("en")
-
-        print(f"Generating Polish PDF ({self.version.upper()})...")
-        await self.generate_pdf_playwright("pl")
+        print(f"Generating English and Polish PDFs ({self.version.upper()})...")
+        tasks = [asyncio.create_task(self.generate_pdf_playwright(language)) for language in ("en", "pl")]
+        try:
+            await asyncio.gather(*tasks)
+        except BaseException:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            raise
 
         print(f"[OK] Both PDFs generated successfully for version: {self.version.upper()}")
 
     @staticmethod
-    def install_requirements() -> None:
+    def check_requirements() -> None:
         try:
             import playwright
         except ImportError:
-            print("Installing playwright...")
-            subprocess.check_call([sys.executable, "-m", "pip", "install", "playwright"])
-            subprocess.check_call([sys.executable, "-m", "playwright", "install", "chromium"])
-            print("[OK] Playwright installed")
+            raise SystemExit("[ERROR] Playwright is not installed. Run: "
+                             "pip install playwright && playwright install chromium") from None
 
-    async def run(self) -> None:
+    async def run(self, language: str = "both") -> None:
         print(f"CV PDF Generator Starting (version: {self.version})...")
 
         if not (self.cv_folder / "cv_yaml.html").exists():
@@ -142,205 +144,113 @@ class CVPDFGenerator:
             return
 
         try:
-            self.install_requirements()
-            self.start_server()
-            await self.generate_both_pdfs()
+            self.check_requirements()
+            await self.start_server()
+
+            from playwright.async_api import async_playwright
+
+            async with async_playwright() as p:
+                self.browser = await p.chromium.launch()
+                try:
+                    if language == "both":
+                        await self.generate_both_pdfs()
+                    else:
+                        await self.generate_pdf_playwright(language)
+                finally:
+                    await self.browser.close()
+                    self.browser = None
         except Exception as e:
             print(f"[ERROR] {e}")
         finally:
             self.stop_server()
 
 
-def generate_pdf_weasyprint(language: str = "en", output_file: str | None = None, base_path: Path | None = None) -> None:
+def _load_cv_data(path: Path) -> dict:
+    stat = path.stat()
+    return _parse_cv_data(path.resolve(), (stat.st_mtime_ns, stat.st_size))
+
+
+@functools.lru_cache(maxsize=4)
+def _parse_cv_data(path: Path, signature: tuple[int, int]) -> dict:
+    pickle_path = path.with_name(path.name + '.pkl')
+    try:
+        with open(pickle_path, 'rb') as f:
+            cached_signature, cv_data = pickle.load(f)
+        if tuple(cached_signature) == signature:
+            return cv_data
+    except (OSError, pickle.UnpicklingError, EOFError, TypeError, ValueError):
+        pass
+
     try:
-        from weasyprint import HTML, CSS
         import yaml
     except ImportError:
-        print("Installing weasyprint and pyyaml...")
-        subprocess.check_call([sys.executable, "-m", "pip", "install", "weasyprint", "pyyaml"])
-        from weasyprint import HTML, CSS
-        import yaml
+        raise SystemExit(WEASYPRINT_REQUIREMENTS_ERROR) from None
+    try:
+        from yaml import CSafeLoader as Loader
+    except ImportError:
+        from yaml import SafeLoader as Loader
 
-    if base_path is None:
-        base_path = Path("./static")
+    with open(path, 'r', encoding='utf-8') as f:
+        cv_data = yaml.load(f, Loader=Loader)
 
-    if not output_file:
-        output_file = f"Lukasz Wisniewski CV_{language}_weasyprint.pdf"
+    try:
+        with open(pickle_path, 'wb') as f:
+            pickle.dump((signature, cv_data), f, protocol=pickle.HIGHEST_PROTOCOL)
+    except OSError:
+        pass
+    return cv_data
 
-    with open(base_path / 'content.yaml', 'r', encoding='utf-8') as f:
-        cv_data = yaml.safe_load(f)
 
-    static_html = create_static_html(cv_data[language], cv_data[language].get('labels', {}))
+@functools.lru_cache(maxsize=None)
+def _get_template(base_path: Path) -> Any:
+    try:
+        from jinja2 import Environment, FileSystemLoader
+    except ImportError:
+        raise SystemExit(WEASYPRINT_REQUIREMENTS_ERROR) from None
 
-    HTML(string=static_html, base_url=str(base_path)).write_pdf(
-        output_file,
-        stylesheets=[CSS(base_path / 'styles/cv.css')]
-    )
-    print(f"[OK] PDF generated with WeasyPrint: {output_file}")
+    env = Environment(loader=FileSystemLoader(base_path), auto_reload=False, cache_size=-1)
+    return env.get_template('cv_template.html')
 
 
-def render_details(details: list[str]) -> str:
-    if len(details) == 1 and '•' not in details[0]:
-        return details[0]
-    return "<ul>" + "".join(f"<li>{d}</li>" for d in details) + "</ul>"
-
-
-def render_experience(experiences: list[dict]) -> str:
-    items = []
-    for exp in experiences:
-        company_html = f'<span class="experience-company">{exp["company"]}</span><br/>' if exp.get('company') else ""
-        tech_html = f'<span class="experience-tech">{exp["technologies"]}</span><br/>' if exp.get('technologies') else ""
-        items.append(
-            f'<div class="experience-year">{exp["years"]}</div>'
-            f'<div>'
-            f'<span class="experience-position">{exp["position"]}</span><br/>'
-            f'{company_html}'
-            f'{tech_html}'
-            f'{render_details(exp["details"])}'
-            f'</div>'
-        )
-    return "".join(items)
-
-
-def render_skills(skills: list[dict]) -> str:
-    return "".join(
-        f'<span class="technology-name">{s["name"]}</span><span class="technology-description">{s["description"]}</span>'
-        for s in skills
-    )
+@functools.lru_cache(maxsize=None)
+def _get_stylesheet(base_path: Path) -> tuple[Any, Any]:
+    try:
+        from weasyprint import CSS
+        from weasyprint.text.fonts import FontConfiguration
+    except ImportError:
+        raise SystemExit(WEASYPRINT_REQUIREMENTS_ERROR) from None
 
+    font_config = FontConfiguration()
+    return CSS(base_path / 'styles/cv.css', font_config=font_config), font_config
 
-def render_education(education: list[dict]) -> str:
-    return "".join(
-        f'''<div class="education-year">{e['year']}</div>
-            <div><span class="education-detail">{e['detail']}</span><br/><span class="education-org">{e['org']}</span></div>'''
-        for e in education
-    )
 
+def generate_pdf_weasyprint(language: str = "en", output_file: str | None = None, base_path: Path | None = None,
+                            cv_data: dict | None = None, version: str = "it") -> None:
+    try:
+        from weasyprint import HTML
+    except ImportError:
+        raise SystemExit(WEASYPRINT_REQUIREMENTS_ERROR) from None
 
-def render_languages(languages: list[dict]) -> str:
-    return "".join(
-        f'<span class="language-name">{l["name"]}</span><span>{l["level"]}</span>'
-        for l in languages
-    )
+    if base_path is None:
+        base_path = Path("./static")
 
+    if not output_file:
+        output_file = f"Lukasz Wisniewski CV {version.upper()} {language} weasyprint.pdf"
 
-def render_disabilities(disabilities: list[dict]) -> str:
-    return "".join(
-        f'<span class="disability-name">{d["name"]}</span><span>{d["level"]}</span>'
-        for d in disabilities
-    )
+    if cv_data is None:
+        cv_data = _load_cv_data(base_path / f'content_{version}.yaml')
 
+    data = cv_data[language]
+    static_html = _get_template(base_path.resolve()).render(data=data, labels=data.get('labels', {}))
 
-def render_certifications(certifications: list[dict]) -> str:
-    if not certifications:
-        return ""
-    return "".join(
-        f'''<div class="certification-year">{c['year']}</div>
-            <div><span class="certification-name">{c['name']}</span><br/><span class="certification-org">{c['org']}</span></div>'''
-        for c in certifications
+    stylesheet, font_config = _get_stylesheet(base_path.resolve())
+    HTML(string=static_html, base_url=str(base_path)).write_pdf(
+        output_file,
+        stylesheets=[stylesheet],
+        font_config=font_config,
+        optimize_images=False
     )
-
-
-def render_project_field(label: str, value: str | None, css_class: str = "") -> str:
-    if not value:
-        return ""
-    class_attr = f' class="{css_class}"' if css_class else ""
-    return f"<strong>{label}</strong><div{class_attr}>{value}</div>"
-
-
-def render_projects(projects: list[dict], labels: dict) -> str:
-    items = []
-    for p in projects:
-        items.append(f'''
-            <h2 class="workproject-heading">{p['years']} {p['title']}</h2>
-            <div class="workproject-intro">{p['intro']}</div>
-            <div class="workproject-details">
-                {render_project_field(labels.get('position', 'Position'), p['position'])}
-                {render_project_field(labels.get('budget', 'Budget'), p.get('budget'), 'project-budget')}
-                {render_project_field(labels.get('team', 'Team'), p.get('team_size'), 'project-team')}
-                {render_project_field(labels.get('technology', 'Technology'), p['technology'])}
-                {render_project_field(labels.get('role', 'Role'), p['role'])}
-            </div>
-        ''')
-    return "".join(items)
-
-
-def create_static_html(data: dict, labels: dict) -> str:
-    return f'''<!DOCTYPE html>
-<html>
-<head>
-    <title>{data['name']}</title>
-    <link rel="stylesheet" href="styles/cv.css">
-    <meta charset="utf-8">
-</head>
-<body>
-    <div id="cv">
-        <section id="header">
-            <div id="name-container">
-                <img id="profile-picture" src="images/CV_1024x1024.png" alt="profile-picture"/>
-                <span id="name">{data['name']}</span>
-            </div>
-            <div id="intro">
-                <span>{data['intro']}</span>
-            </div>
-        </section>
-
-        <section id="contact">
-            <a class="phoneNumber" href="tel:{data['contact']['phone']}">
-                <span class="fas fa-phone icon"></span><span>{data['contact']['phone']}</span>
-            </a>
-            <a href="mailto:{data['contact']['email']}">
-                <span class="fas fa-envelope icon"></span><span>{data['contact']['email']}</span>
-            </a>
-            <a href="{data['contact']['linkedin']}">
-                <span class="fab fa-linkedin icon"></span><span>linkedin.com/in/lukasz0wisniewski</span>
-            </a>
-            <span class="contact-location">
-                <span class="fas fa-location-dot icon"></span><span>{data['contact'].get('location', '')}</span>
-            </span>
-        </section>
-
-        <h1>{labels.get('experience', 'Experience')}</h1>
-        <section id="experience" class="section-experience">
-            {render_experience(data['experience'])}
-        </section>
-
-        <h1>{labels.get('skills', 'Skills and Technology')}</h1>
-        <div class="section-large" id="technology-list">
-            {render_skills(data['skills'])}
-        </div>
-        <div id="technology-other">
-            {data.get('skills_other', '')}
-        </div>
-
-        <section id="education" class="two-sections">
-            <div>
-                <h1>{labels.get('education', 'Education')}</h1>
-                <section class="section-small">
-                    {render_education(data['education'])}
-                </section>
-            </div>
-            <div>
-                <h1>{labels.get('certifications', 'Certifications')}</h1>
-                <section class="section-small">
-                    {render_certifications(data.get('certifications', []))}
-                </section>
-                <h1>{labels.get('language', 'Language')}</h1>
-                <section class="section-small">
-                    {render_languages(data['languages'])}
-                </section>
-                <h1>{labels.get('disability', 'Certificate of Disability')}</h1>
-                <section class="section-small">
-                    {render_disabilities(data.get('disabilities', []))}
-                </section>
-            </div>
-        </section>
-
-        <h1 id="work-projects">{labels.get('projects', 'Project highlights')}</h1>
-        {render_projects(data['projects'], labels)}
-    </div>
-</body>
-</html>'''
+    print(f"[OK] PDF generated with WeasyPrint: {output_file}")
 
 
 def main() -> None:
@@ -361,21 +271,14 @@ def main() -> None:
     if args.method == 'playwright':
         for version in versions:
             generator = CVPDFGenerator(port=args.port, version=version)
-            if args.language == 'both':
-                asyncio.run(generator.run())
-            else:
-                generator.install_requirements()
-                generator.start_server()
-                try:
-                    asyncio.run(generator.generate_pdf_playwright(args.language))
-                finally:
-                    generator.stop_server()
+            asyncio.run(generator.run(args.language))
     else:
-        if args.language in ['en', 'pl']:
-            generate_pdf_weasyprint(args.language)
-        else:
-            generate_pdf_weasyprint('en')
-            generate_pdf_weasyprint('pl')
+        base_path = Path("./static")
+        languages = ['en', 'pl'] if args.language == 'both' else [args.language]
+        for version in versions:
+            cv_data = _load_cv_data(base_path / f'content_{version}.yaml')
+            for language in languages:
+                generate_pdf_weasyprint(language, base_path=base_path, cv_data=cv_data, version=version)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,8 @@
+import multiprocessing
+
+# Each worker imports api_server on its own and starts a private PDFService:
+# one Chromium and one page pool, with static assets served from its memory.
+bind = "0.0.0.0:8000"
+workers = multiprocessing.cpu_count()
+# UvicornWorker selects uvloop and httptools automatically; uvicorn[standard] installs both.
+worker_class = "uvicorn_worker.UvicornWorker"
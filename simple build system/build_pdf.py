@@ -1,10 +1,13 @@
 from weasyprint import HTML, CSS
+from weasyprint.text.fonts import FontConfiguration
 
+font_config = FontConfiguration()
 html = HTML('static/cv.html')
-css = CSS('static/styles/cv.css')
+css = CSS('static/styles/cv.css', font_config=font_config)
 
 html.write_pdf(
     'Lukasz Wisniewski CV.pdf',
     stylesheets=[css],
-    optimize_size=()
-)
\ No newline at end of file
+    font_config=font_config,
+    optimize_images=False
+)
@@ -0,0 +1,6 @@
+// Injected into pooled API pages before cv_yaml.html's own scripts run.
+window.__renderCV = (data, lang) => {
+    cvData = data;
+    currentLang = lang;
+    renderCV();
+};
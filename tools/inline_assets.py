@@ -0,0 +1,63 @@
+#!/usr/bin/env python3
+
+from __future__ import annotations
+
+import argparse
+import base64
+import json
+import mimetypes
+import re
+from pathlib import Path
+
+STATIC_DIR = Path("./static")
+
+STYLESHEET_RE = re.compile(r'<link rel="stylesheet" href="([^"]+)">')
+CSS_URL_RE = re.compile(r'url\("([^"]+)"\)')
+
+mimetypes.add_type("font/woff2", ".woff2")
+mimetypes.add_type("font/ttf", ".ttf")
+
+
+def data_uri(path: Path) -> str:
+    content_type = mimetypes.guess_type(path.name)[0] or "application/octet-stream"
+    return f"data:{content_type};base64,{base64.b64encode(path.read_bytes()).decode('ascii')}"
+
+
+def inline_stylesheet(static_dir: Path, href: str, sources: set[str]) -> str:
+    css_path = static_dir / href
+    sources.add(href)
+
+    def replace_url(match: re.Match[str]) -> str:
+        asset = (css_path.parent / match.group(1)).resolve()
+        if asset.is_file():
+            sources.add(asset.relative_to(static_dir.resolve()).as_posix())
+            return f'url("{data_uri(asset)}")'
+        return f'url("{asset.relative_to(static_dir.resolve()).as_posix()}")'
+
+    css = CSS_URL_RE.sub(replace_url, css_path.read_text(encoding="utf-8"))
+    return f"<style>\n{css}\n</style>"
+
+
+def build(static_dir: Path, source: str = "cv_yaml.html", target: str = "cv_inline.html") -> Path:
+    sources = {source}
+    html = (static_dir / source).read_text(encoding="utf-8")
+    html = STYLESHEET_RE.sub(lambda m: inline_stylesheet(static_dir, m.group(1), sources), html)
+
+    output = static_dir / target
+    output.write_text(html, encoding="utf-8")
+    output.with_name(output.name + ".sources").write_text(json.dumps(sorted(sources), indent=2), encoding="utf-8")
+    return output
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='Inline the CV stylesheet and its fonts into a single HTML page')
+    parser.add_argument('--static-dir', type=Path, default=STATIC_DIR,
+                        help='Directory containing cv_yaml.html')
+    args = parser.parse_args()
+
+    output = build(args.static_dir)
+    print(f"[OK] Inlined assets written to {output}")
+
+
+if __name__ == "__main__":
+    main()